@@ -1225,6 +1225,9 @@ def chat(
             prompt, fragments, attachments = process_fragments_in_chat(db, prompt)
         if prompt.strip() == "!clipboard":
             try:
+                # Each !clipboard directive is an explicit request for a
+                # fresh read - drop the memoized result from earlier reads
+                resolve_clipboard.cache_clear()
                 clipboard_content = resolve_clipboard()
                 if isinstance(clipboard_content, Attachment):
                     attachments.append(clipboard_content)
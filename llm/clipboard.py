@@ -1,5 +1,10 @@
+import concurrent.futures
+import functools
 import io
+import os
+import shutil
 import sys
+import threading
 from typing import Optional, Union
 
 from .models import Attachment
@@ -10,125 +15,302 @@ class ClipboardError(Exception):
     pass
 
 
-def get_clipboard_image() -> Optional[bytes]:
+# Upper bounds on clipboard payloads - anything larger would be rejected by
+# the API anyway, so fail fast instead of buffering hundreds of MB
+_MAX_TEXT_BYTES = 32 * 1024 * 1024
+_MAX_IMAGE_BYTES = 64 * 1024 * 1024
+
+# The Windows clipboard is a single shared resource: concurrent OpenClipboard
+# calls from the parallel probes in resolve_clipboard fail or silently return
+# nothing for whichever thread loses. All Windows clipboard access goes
+# through this lock.
+_windows_clipboard_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _which(command: str) -> Optional[str]:
+    """shutil.which() cached per process - PATH does not change under us."""
+    return shutil.which(command)
+
+
+@functools.lru_cache(maxsize=None)
+def _pil_imagegrab():
+    """Return PIL.ImageGrab, or None if PIL is not installed."""
+    try:
+        from PIL import ImageGrab
+
+        return ImageGrab
+    except ImportError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _win32clipboard():
+    """Return the win32clipboard module, or None if it is not installed."""
+    try:
+        import win32clipboard
+
+        return win32clipboard
+    except ImportError:
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _windows_clipboard_formats() -> frozenset:
+    """
+    Enumerate the formats currently on the Windows clipboard in a single
+    open/close cycle.
+
+    Cached per process: the image and text probes share one clipboard lock
+    instead of each opening the clipboard to ask about their own formats
+    (clipboard locks serialize across processes on Windows).
+    """
+    win32clipboard = _win32clipboard()
+    if win32clipboard is None:
+        return frozenset()
+    formats = set()
+    win32clipboard.OpenClipboard()
+    try:
+        format_id = win32clipboard.EnumClipboardFormats(0)
+        while format_id:
+            formats.add(format_id)
+            format_id = win32clipboard.EnumClipboardFormats(format_id)
+    finally:
+        win32clipboard.CloseClipboard()
+    return frozenset(formats)
+
+
+@functools.lru_cache(maxsize=1)
+def _linux_clipboard_targets() -> Optional[frozenset]:
+    """
+    Return the set of targets advertised by the X clipboard, or None if
+    they could not be determined (no xclip, no display, ...).
+
+    Cached per process: repeated clipboard reads within one invocation
+    share a single xclip spawn for the TARGETS query.
+    """
+    if _which("xclip") is None:
+        return None
+
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            ["xclip", "-selection", "clipboard", "-t", "TARGETS", "-o"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            close_fds=False,
+        )
+        if result.returncode == 0:
+            return frozenset(result.stdout.decode("ascii", errors="replace").split())
+    except Exception:
+        pass
+    return None
+
+
+def _png_compress_level() -> int:
+    """
+    zlib level for clipboard PNG encodes - defaults to 1, since these
+    images are uploaded to an API immediately rather than archived, and
+    level 1 encodes several times faster than the default level 6 for
+    only modestly larger output. Override with LLM_CLIPBOARD_PNG_LEVEL,
+    clamped to the 0-9 range zlib accepts.
+    """
+    try:
+        level = int(os.environ.get("LLM_CLIPBOARD_PNG_LEVEL", "1"))
+    except ValueError:
+        return 1
+    return min(max(level, 0), 9)
+
+
+def _encode_image(img) -> memoryview:
+    """Encode a PIL image for upload, returned as a view over the encode buffer."""
+    if img.mode == "RGBA":
+        # Screenshots frequently carry a fully opaque alpha channel -
+        # dropping it saves a whole channel's worth of zlib work and
+        # ~30% of output size. getextrema() is a C-level scan, far
+        # cheaper than encoding the extra channel.
+        if img.getextrema()[3] == (255, 255):
+            img = img.convert("RGB")
+    buffer = io.BytesIO()
+    if os.environ.get("LLM_CLIPBOARD_IMAGE_FORMAT", "png").lower() == "webp":
+        # Lossless WebP at method=0 encodes several times faster than PNG
+        # for typical screenshots, at a modest size premium - useful when
+        # the target model accepts image/webp
+        img.save(buffer, format="WEBP", lossless=True, quality=0, method=0)
+    else:
+        img.save(
+            buffer, format="PNG", compress_level=_png_compress_level(), optimize=False
+        )
+    # getbuffer() exposes the BytesIO's internal buffer directly, skipping
+    # the full-size copy that getvalue() would make; the view keeps the
+    # buffer alive
+    return buffer.getbuffer()
+
+
+def get_clipboard_image() -> Optional[Union[bytes, memoryview]]:
     """
     Attempt to get image data from the clipboard.
 
+    The "which formats are on the clipboard" probe is cached per process;
+    call ``resolve_clipboard.cache_clear()`` if the clipboard may have
+    changed since the last read.
+
     Returns:
-        bytes: PNG image data if an image is on the clipboard
+        bytes or memoryview: PNG image data if an image is on the clipboard
         None: if no image is available
     """
-    if sys.platform == "win32":
-        return _get_clipboard_image_windows()
-    elif sys.platform == "darwin":
-        return _get_clipboard_image_macos()
-    else:
-        return _get_clipboard_image_linux()
+    return _image_fn()
 
 
 def get_clipboard_text() -> Optional[str]:
     """
     Get text from the clipboard.
 
+    The "which formats are on the clipboard" probe is cached per process;
+    call ``resolve_clipboard.cache_clear()`` if the clipboard may have
+    changed since the last read.
+
     Returns:
         str: text content if available
         None: if clipboard is empty or doesn't contain text
     """
-    if sys.platform == "win32":
-        return _get_clipboard_text_windows()
-    elif sys.platform == "darwin":
-        return _get_clipboard_text_macos()
-    else:
-        return _get_clipboard_text_linux()
+    return _text_fn()
 
 
-def _get_clipboard_image_windows() -> Optional[bytes]:
+def _get_clipboard_image_windows() -> Optional[Union[bytes, memoryview]]:
     """Get image from Windows clipboard using win32clipboard or PIL."""
-    try:
-        from PIL import ImageGrab
+    with _windows_clipboard_lock:
+        return _get_clipboard_image_windows_locked()
+
+
+def _get_clipboard_image_windows_locked() -> Optional[Union[bytes, memoryview]]:
+    """The body of _get_clipboard_image_windows, called with the lock held."""
+    win32clipboard = _win32clipboard()
+
+    # Check the advertised formats first - ImageGrab.grabclipboard() walks
+    # the whole format chain, which is wasted work when the clipboard only
+    # holds text (the common case for a CLI tool)
+    if win32clipboard is not None:
+        formats = _windows_clipboard_formats()
+        if (
+            win32clipboard.CF_DIB not in formats
+            and win32clipboard.CF_BITMAP not in formats
+        ):
+            return None
 
+    ImageGrab = _pil_imagegrab()
+    if ImageGrab is not None:
         img = ImageGrab.grabclipboard()
         if img is not None and hasattr(img, "save"):
             # It's a PIL Image
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            return buffer.getvalue()
+            return _encode_image(img)
         return None
-    except ImportError:
-        # Try win32clipboard as fallback
-        try:
-            import win32clipboard
 
-            win32clipboard.OpenClipboard()
-            try:
-                # Try to get DIB format
-                if win32clipboard.IsClipboardFormatAvailable(
-                    win32clipboard.CF_DIB
-                ):
-                    data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
-                    # Convert DIB to PNG using PIL if available
-                    try:
-                        from PIL import Image
-
-                        # DIB data needs special handling
-                        img = Image.open(io.BytesIO(data))
-                        buffer = io.BytesIO()
-                        img.save(buffer, format="PNG")
-                        return buffer.getvalue()
-                    except Exception:
-                        return None
-                return None
-            finally:
-                win32clipboard.CloseClipboard()
-        except ImportError:
-            return None
+    # Try win32clipboard as fallback - the format walk above already told
+    # us whether a DIB is available
+    if win32clipboard is None or win32clipboard.CF_DIB not in formats:
+        return None
+
+    win32clipboard.OpenClipboard()
+    try:
+        data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
+    finally:
+        win32clipboard.CloseClipboard()
+
+    # Convert DIB to PNG using PIL if available
+    try:
+        import struct
+
+        from PIL import Image
+
+        # A clipboard DIB lacks the 14-byte BITMAPFILEHEADER
+        # that PIL's BMP decoder expects - prepend one, with
+        # the pixel offset derived from the info header size
+        info_header_size = int.from_bytes(data[:4], "little")
+        bmp = (
+            b"BM"
+            + struct.pack("<IHHI", 14 + len(data), 0, 0, 14 + info_header_size)
+            + data
+        )
+        img = Image.open(io.BytesIO(bmp))
+        return _encode_image(img)
+    except Exception:
+        return None
 
 
 def _get_clipboard_text_windows() -> Optional[str]:
     """Get text from Windows clipboard."""
-    try:
-        import win32clipboard
+    with _windows_clipboard_lock:
+        return _get_clipboard_text_windows_locked()
 
+
+def _get_clipboard_text_windows_locked() -> Optional[str]:
+    """The body of _get_clipboard_text_windows, called with the lock held."""
+    win32clipboard = _win32clipboard()
+    if win32clipboard is not None:
+        if win32clipboard.CF_UNICODETEXT not in _windows_clipboard_formats():
+            return None
         win32clipboard.OpenClipboard()
         try:
-            if win32clipboard.IsClipboardFormatAvailable(
-                win32clipboard.CF_UNICODETEXT
-            ):
-                data = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
-                return data if data else None
-            return None
+            data = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+            return data if data else None
         finally:
             win32clipboard.CloseClipboard()
-    except ImportError:
-        # Fallback to tkinter
+    else:
+        # Fallback to ctypes - calling user32 directly avoids spinning up
+        # an entire GUI toolkit (tkinter) just to read a string
+        import ctypes
+
+        CF_UNICODETEXT = 13
+        user32 = ctypes.windll.user32  # type: ignore[attr-defined]
+        kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        if not user32.OpenClipboard(0):
+            return None
         try:
-            import tkinter as tk
-
-            root = tk.Tk()
-            root.withdraw()
-            try:
-                text = root.clipboard_get()
-                return text if text else None
-            except tk.TclError:
+            handle = user32.GetClipboardData(CF_UNICODETEXT)
+            if not handle:
+                return None
+            pointer = kernel32.GlobalLock(handle)
+            if not pointer:
                 return None
+            try:
+                text = ctypes.wstring_at(pointer)
             finally:
-                root.destroy()
-        except Exception:
-            return None
+                kernel32.GlobalUnlock(handle)
+            return text if text else None
+        finally:
+            user32.CloseClipboard()
 
 
-def _get_clipboard_image_macos() -> Optional[bytes]:
+def _get_clipboard_image_macos() -> Optional[Union[bytes, memoryview]]:
     """Get image from macOS clipboard using pasteboard."""
+    # Prefer the native pasteboard API (pyobjc) - a single library call
+    # with no subprocess spawn
     try:
-        from PIL import ImageGrab
+        from AppKit import NSPasteboard, NSPasteboardTypePNG, NSPasteboardTypeTIFF
+
+        pasteboard = NSPasteboard.generalPasteboard()
+        # Metadata-only check: if no image type is advertised at all,
+        # skip the fetch and decode entirely
+        types = set(pasteboard.types() or ())
+        if NSPasteboardTypePNG not in types and NSPasteboardTypeTIFF not in types:
+            return None
+        data = pasteboard.dataForType_(NSPasteboardTypePNG)
+        if data:
+            return bytes(data)
+        # Only TIFF on the pasteboard - fall through in case PIL can
+        # convert it (e.g. a screenshot)
+    except ImportError:
+        pass
 
+    ImageGrab = _pil_imagegrab()
+    if ImageGrab is not None:
         img = ImageGrab.grabclipboard()
         if img is not None and hasattr(img, "save"):
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            return buffer.getvalue()
+            return _encode_image(img)
         return None
-    except ImportError:
+    else:
         # Fallback to using osascript/pbpaste for PNG
         import subprocess
 
@@ -146,7 +328,9 @@ def _get_clipboard_image_macos() -> Optional[bytes]:
             """
             result = subprocess.run(
                 ["osascript", "-e", script],
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                close_fds=False,
             )
             if result.returncode == 0 and result.stdout:
                 # osascript returns hex-encoded data, need to decode
@@ -157,82 +341,149 @@ def _get_clipboard_image_macos() -> Optional[bytes]:
 
 
 def _get_clipboard_text_macos() -> Optional[str]:
-    """Get text from macOS clipboard using pbpaste."""
+    """Get text from macOS clipboard using pasteboard or pbpaste."""
+    # Prefer the native pasteboard API (pyobjc) over spawning pbpaste
+    try:
+        from AppKit import NSPasteboard, NSPasteboardTypeString
+
+        pasteboard = NSPasteboard.generalPasteboard()
+        text = pasteboard.stringForType_(NSPasteboardTypeString)
+        return str(text) if text else None
+    except ImportError:
+        pass
+
+    return _run_text_tool(["pbpaste"])
+
+
+def _read_bounded(command, limit: int) -> Optional[bytes]:
+    """
+    Run a command and read at most ``limit`` bytes of its stdout.
+
+    Returns None if the command could not be run or failed. Raises
+    ClipboardError if the output exceeds the limit, killing the child
+    rather than buffering an arbitrarily large payload.
+    """
     import subprocess
 
     try:
-        result = subprocess.run(
-            ["pbpaste"],
-            capture_output=True,
-            text=True,
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            close_fds=False,
         )
-        if result.returncode == 0 and result.stdout:
-            return result.stdout
-        return None
     except Exception:
         return None
+    assert process.stdout is not None
+    try:
+        data = process.stdout.read(limit + 1)
+        if len(data) > limit:
+            process.kill()
+            raise ClipboardError(
+                "Clipboard content exceeds {:,} bytes".format(limit)
+            )
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode == 0 and data:
+        return data
+    return None
 
 
-def _get_clipboard_image_linux() -> Optional[bytes]:
-    """Get image from Linux clipboard using xclip or PIL."""
-    try:
-        from PIL import ImageGrab
+def _run_text_tool(command) -> Optional[str]:
+    """
+    Run a clipboard tool and return its decoded stdout, or None.
+
+    Reads raw bytes and decodes them in a single pass at the end -
+    text=True would route a potentially MB-scale clipboard through a
+    TextIOWrapper instead.
+    """
+    data = _read_bounded(command, _MAX_TEXT_BYTES)
+    if data is None:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _xclip_fetch_png() -> Optional[bytes]:
+    """Fetch raw image/png bytes from the X clipboard via xclip."""
+    # The bytes are already PNG - no decode needed
+    return _read_bounded(
+        ["xclip", "-selection", "clipboard", "-t", "image/png", "-o"],
+        _MAX_IMAGE_BYTES,
+    )
 
+
+def _get_clipboard_image_linux() -> Optional[Union[bytes, memoryview]]:
+    """Get image from Linux clipboard using xclip or PIL."""
+    # One cheap TARGETS query tells us whether any image is on the
+    # clipboard at all, avoiding the expensive grab when there is not
+    targets = _linux_clipboard_targets()
+    if targets is not None:
+        if not any(t.startswith("image/") for t in targets):
+            return None
+        if "image/png" in targets:
+            # The clipboard already holds PNG bytes - pass them through
+            # rather than decoding and re-encoding via PIL
+            png = _xclip_fetch_png()
+            if png is not None:
+                return png
+
+    # Only non-PNG image targets (e.g. image/bmp) remain - let PIL convert
+    ImageGrab = _pil_imagegrab()
+    if ImageGrab is not None:
         img = ImageGrab.grabclipboard()
         if img is not None and hasattr(img, "save"):
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            return buffer.getvalue()
+            return _encode_image(img)
         return None
-    except ImportError:
-        pass
 
     # Fallback to xclip
-    import subprocess
-
-    try:
-        result = subprocess.run(
-            ["xclip", "-selection", "clipboard", "-t", "image/png", "-o"],
-            capture_output=True,
-        )
-        if result.returncode == 0 and result.stdout:
-            return result.stdout
-        return None
-    except Exception:
+    if _which("xclip") is None:
         return None
+    return _xclip_fetch_png()
 
 
 def _get_clipboard_text_linux() -> Optional[str]:
-    """Get text from Linux clipboard using xclip or xsel."""
-    import subprocess
-
-    # Try xclip first
+    """Get text from Linux clipboard using GTK, xclip or xsel."""
+    # Prefer the GTK clipboard API (PyGObject) - a single library call
+    # instead of a fork+exec round trip through xclip/xsel
     try:
-        result = subprocess.run(
-            ["xclip", "-selection", "clipboard", "-o"],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            return result.stdout if result.stdout else None
-    except Exception:
-        pass
+        import gi
 
-    # Try xsel as fallback
-    try:
-        result = subprocess.run(
-            ["xsel", "--clipboard", "--output"],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            return result.stdout if result.stdout else None
+        gi.require_version("Gtk", "3.0")
+        from gi.repository import Gtk, Gdk
+
+        clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
+        text = clipboard.wait_for_text()
+        if text:
+            return text
+        # wait_for_text() returns None both for "no text" and for
+        # selection errors - fall through to the subprocess path
     except Exception:
         pass
 
-    return None
+    # Dispatch off whichever tool is installed - checking once avoids a
+    # wasted fork+exec per call on systems without xclip
+    if _which("xclip"):
+        command = ["xclip", "-selection", "clipboard", "-o"]
+    elif _which("xsel"):
+        command = ["xsel", "--clipboard", "--output"]
+    else:
+        return None
+
+    return _run_text_tool(command)
+
 
+# Resolve the platform dispatch once at import time - sys.platform cannot
+# change while the process is running
+if sys.platform == "win32":
+    _image_fn, _text_fn = _get_clipboard_image_windows, _get_clipboard_text_windows
+elif sys.platform == "darwin":
+    _image_fn, _text_fn = _get_clipboard_image_macos, _get_clipboard_text_macos
+else:
+    _image_fn, _text_fn = _get_clipboard_image_linux, _get_clipboard_text_linux
 
+
+@functools.lru_cache(maxsize=1)
 def resolve_clipboard() -> Union[Attachment, str]:
     """
     Get clipboard contents as an Attachment (for images) or string (for text).
@@ -240,6 +491,11 @@ def resolve_clipboard() -> Union[Attachment, str]:
     This function first tries to get an image from the clipboard. If no image
     is available, it falls back to text content.
 
+    The result is cached for the lifetime of the process, so combining
+    ``--clipboard`` with other options that also read the clipboard only
+    probes it once. Call ``resolve_clipboard.cache_clear()`` to force a
+    fresh read.
+
     Returns:
         Attachment: if the clipboard contains an image
         str: if the clipboard contains text
@@ -247,13 +503,34 @@ def resolve_clipboard() -> Union[Attachment, str]:
     Raises:
         ClipboardError: if the clipboard is empty or inaccessible
     """
-    # First, try to get an image
-    image_data = get_clipboard_image()
+    # Probe for image and text concurrently - both block on I/O
+    # (subprocess or display server), so threads overlap them cleanly
+    # and the total wall time is max() rather than the sum
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        image_future = executor.submit(get_clipboard_image)
+        text_future = executor.submit(get_clipboard_text)
+        image_data = image_future.result()
+        try:
+            text = text_future.result()
+        except ClipboardError:
+            # An oversized text clipboard must not mask a valid image -
+            # the sequential code never ran the text probe once an image
+            # was found, so only surface its error when there is no image
+            if not image_data:
+                raise
+            text = None
+
+    # An image takes priority over text
     if image_data:
-        # Determine the mimetype
-        mimetype = mimetype_from_string(image_data)
-        if mimetype is None:
-            mimetype = "image/png"  # Default to PNG since we convert to PNG
+        # All our image paths emit PNG, so an 8-byte signature check
+        # usually settles the mimetype without magic-byte sniffing
+        # over the whole payload
+        if image_data[:8] == b"\x89PNG\r\n\x1a\n":
+            mimetype = "image/png"
+        else:
+            # puremagic wants real bytes, not a memoryview; default to PNG
+            # since that is what we convert to
+            mimetype = mimetype_from_string(bytes(image_data)) or "image/png"
 
         return Attachment(
             type=mimetype,
@@ -263,7 +540,6 @@ def resolve_clipboard() -> Union[Attachment, str]:
         )
 
     # Fall back to text
-    text = get_clipboard_text()
     if text:
         return text
 
@@ -271,3 +547,18 @@ def resolve_clipboard() -> Union[Attachment, str]:
         "Clipboard is empty or contains unsupported content. "
         "Supported content types: images (PNG, JPEG, etc.) and text."
     )
+
+
+_resolve_clipboard_cache_clear = resolve_clipboard.cache_clear
+
+
+def _cache_clear() -> None:
+    # The format probes are memoized alongside the result - clear them
+    # together, otherwise a fresh read would dispatch off a stale
+    # TARGETS/formats snapshot and miss newly copied content
+    _linux_clipboard_targets.cache_clear()
+    _windows_clipboard_formats.cache_clear()
+    _resolve_clipboard_cache_clear()
+
+
+resolve_clipboard.cache_clear = _cache_clear  # type: ignore[method-assign]
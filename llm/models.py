@@ -56,7 +56,9 @@ class Attachment:
     type: Optional[str] = None
     path: Optional[str] = None
     url: Optional[str] = None
-    content: Optional[bytes] = None
+    # Any bytes-like object - hashing, base64 and SQLite all accept a
+    # memoryview, which lets callers hand over encode buffers without a copy
+    content: Optional[Union[bytes, memoryview]] = None
     _id: Optional[str] = None
 
     def id(self):
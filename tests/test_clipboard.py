@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 from click.testing import CliRunner
 from unittest.mock import patch, MagicMock
@@ -7,6 +9,7 @@ from llm.clipboard import (
     resolve_clipboard,
     get_clipboard_image,
     get_clipboard_text,
+    _read_bounded,
 )
 
 TINY_PNG = (
@@ -20,6 +23,14 @@ TINY_PNG = (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_resolve_clipboard_cache():
+    # resolve_clipboard memoizes its result for the process lifetime
+    resolve_clipboard.cache_clear()
+    yield
+    resolve_clipboard.cache_clear()
+
+
 class TestResolveClipboard:
     """Tests for the resolve_clipboard function."""
 
@@ -69,9 +80,85 @@ class TestResolveClipboard:
 
                 result = resolve_clipboard()
 
-                # Should get the image, not the text
+                # Should get the image, not the text - the text probe runs
+                # concurrently with the image probe but its result is ignored
                 assert isinstance(result, Attachment)
-                mock_get_text.assert_not_called()
+                assert result.content == TINY_PNG
+
+    def test_resolve_clipboard_image_wins_over_oversized_text(self):
+        """Test that a text probe size error does not mask a valid image."""
+        with patch("llm.clipboard.get_clipboard_image") as mock_get_image:
+            with patch("llm.clipboard.get_clipboard_text") as mock_get_text:
+                mock_get_image.return_value = TINY_PNG
+                mock_get_text.side_effect = ClipboardError(
+                    "Clipboard content exceeds 33,554,432 bytes"
+                )
+
+                result = resolve_clipboard()
+
+                assert isinstance(result, Attachment)
+                assert result.content == TINY_PNG
+
+    def test_resolve_clipboard_oversized_text_still_raises(self):
+        """Test that the size error surfaces when there is no image."""
+        with patch("llm.clipboard.get_clipboard_image") as mock_get_image:
+            with patch("llm.clipboard.get_clipboard_text") as mock_get_text:
+                mock_get_image.return_value = None
+                mock_get_text.side_effect = ClipboardError(
+                    "Clipboard content exceeds 33,554,432 bytes"
+                )
+
+                with pytest.raises(ClipboardError) as exc_info:
+                    resolve_clipboard()
+
+                assert "exceeds" in str(exc_info.value)
+
+    def test_resolve_clipboard_memoizes_result(self):
+        """Test that a second call does not re-probe the clipboard."""
+        with patch("llm.clipboard.get_clipboard_image") as mock_get_image:
+            mock_get_image.return_value = TINY_PNG
+
+            first = resolve_clipboard()
+            second = resolve_clipboard()
+
+            assert first is second
+            mock_get_image.assert_called_once()
+
+
+class TestReadBounded:
+    """Tests for the bounded subprocess reads that cap clipboard size."""
+
+    def test_under_limit_returns_output(self):
+        result = _read_bounded([sys.executable, "-c", "print('hello', end='')"], 100)
+        assert result == b"hello"
+
+    def test_failed_command_returns_none(self):
+        result = _read_bounded([sys.executable, "-c", "raise SystemExit(1)"], 100)
+        assert result is None
+
+    def test_over_limit_raises_and_reaps_child(self):
+        import subprocess
+
+        children = []
+        real_popen = subprocess.Popen
+
+        def recording_popen(*args, **kwargs):
+            process = real_popen(*args, **kwargs)
+            children.append(process)
+            return process
+
+        # Child emits more than the limit then hangs - only a kill ends it
+        script = (
+            "import sys, time; sys.stdout.write('x' * 200); "
+            "sys.stdout.flush(); time.sleep(30)"
+        )
+        with patch("subprocess.Popen", side_effect=recording_popen):
+            with pytest.raises(ClipboardError) as exc_info:
+                _read_bounded([sys.executable, "-c", script], 100)
+
+        assert "exceeds" in str(exc_info.value)
+        # The child was killed and reaped rather than left running
+        assert children[0].returncode is not None
 
 
 class TestClipboardCLI: